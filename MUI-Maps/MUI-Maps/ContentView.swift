@@ -144,19 +144,8 @@ struct MKMapViewContainer: NSViewRepresentable {
         return true
     }
 
-    private func lonForTileX(_ x: Int, zoom z: Int) -> Double {
-        let n = pow(2.0, Double(z))
-        return (Double(x) / n) * 360.0 - 180.0
-    }
-
-    private func latForTileY(_ y: Int, zoom z: Int) -> Double {
-        let n = pow(2.0, Double(z))
-        let latRad = atan(sinh(.pi * (1.0 - 2.0 * Double(y) / n)))
-        return latRad * 180.0 / .pi
-    }
-
     private func tileXY(for coord: CLLocationCoordinate2D, zoom z: Int) -> (x: Int, y: Int) {
-        let n = pow(2.0, Double(z))
+        let n = Double(1 << z)
         let latRad = coord.latitude * .pi / 180.0
         var x = Int(floor((coord.longitude + 180.0) / 360.0 * n))
         var y = Int(floor((1.0 - log(tan(latRad) + 1.0 / cos(latRad)) / .pi) / 2.0 * n))
@@ -200,7 +189,7 @@ struct MKMapViewContainer: NSViewRepresentable {
 
         func updateExportOverlay(on mapView: MKMapView, center: CLLocationCoordinate2D, zoom: Int, radius: Int) {
             // Compute tile bounds around center tile
-            let n = Int(pow(2.0, Double(zoom)))
+            let n = 1 << zoom
             let centerTile = parent.tileXY(for: center, zoom: zoom)
             let minX = max(0, centerTile.x - radius)
             let maxX = min(n - 1, centerTile.x + radius)
@@ -208,10 +197,10 @@ struct MKMapViewContainer: NSViewRepresentable {
             let maxY = min(n - 1, centerTile.y + radius)
 
             // Convert tile edges to geographic bounds
-            let leftLon = parent.lonForTileX(minX, zoom: zoom)
-            let rightLon = parent.lonForTileX(maxX + 1, zoom: zoom)
-            let topLat = parent.latForTileY(minY, zoom: zoom)
-            let bottomLat = parent.latForTileY(maxY + 1, zoom: zoom)
+            let leftLon = Tile.lonForTileX(minX, zoom: zoom)
+            let rightLon = Tile.lonForTileX(maxX + 1, zoom: zoom)
+            let topLat = Tile.latForTileY(minY, zoom: zoom)
+            let bottomLat = Tile.latForTileY(maxY + 1, zoom: zoom)
 
             let coords: [CLLocationCoordinate2D] = [
                 CLLocationCoordinate2D(latitude: topLat, longitude: leftLon),    // top-left
@@ -234,7 +223,7 @@ struct MKMapViewContainer: NSViewRepresentable {
             var newGrid: [MKPolyline] = []
             // Vertical grid lines at each tile boundary lon
             for x in minX...maxX+1 {
-                let lon = parent.lonForTileX(x, zoom: zoom)
+                let lon = Tile.lonForTileX(x, zoom: zoom)
                 let lineCoords = [
                     CLLocationCoordinate2D(latitude: topLat, longitude: lon),
                     CLLocationCoordinate2D(latitude: bottomLat, longitude: lon)
@@ -244,7 +233,7 @@ struct MKMapViewContainer: NSViewRepresentable {
             }
             // Horizontal grid lines at each tile boundary lat
             for y in minY...maxY+1 {
-                let lat = parent.latForTileY(y, zoom: zoom)
+                let lat = Tile.latForTileY(y, zoom: zoom)
                 let lineCoords = [
                     CLLocationCoordinate2D(latitude: lat, longitude: leftLon),
                     CLLocationCoordinate2D(latitude: lat, longitude: rightLon)
@@ -269,20 +258,20 @@ struct MKMapViewContainer: NSViewRepresentable {
             maxGridOverlays.removeAll()
 
             // Compute geographic bounds from min zoom + radius
-            let nMin = Int(pow(2.0, Double(minZoom)))
+            let nMin = 1 << minZoom
             let centerTileMin = parent.tileXY(for: center, zoom: minZoom)
             let minXMin = max(0, centerTileMin.x - radius)
             let maxXMin = min(nMin - 1, centerTileMin.x + radius)
             let minYMin = max(0, centerTileMin.y - radius)
             let maxYMin = min(nMin - 1, centerTileMin.y + radius)
 
-            let leftLon = parent.lonForTileX(minXMin, zoom: minZoom)
-            let rightLon = parent.lonForTileX(maxXMin + 1, zoom: minZoom)
-            let topLat = parent.latForTileY(minYMin, zoom: minZoom)
-            let bottomLat = parent.latForTileY(maxYMin + 1, zoom: minZoom)
+            let leftLon = Tile.lonForTileX(minXMin, zoom: minZoom)
+            let rightLon = Tile.lonForTileX(maxXMin + 1, zoom: minZoom)
+            let topLat = Tile.latForTileY(minYMin, zoom: minZoom)
+            let bottomLat = Tile.latForTileY(maxYMin + 1, zoom: minZoom)
 
             // Convert geographic bounds to max-zoom boundary indices
-            let nMax = Int(pow(2.0, Double(maxZoom)))
+            let nMax = 1 << maxZoom
             let nMaxD = Double(nMax)
             let xStart = max(0, Int(floor((leftLon + 180.0) / 360.0 * nMaxD)))
             let xEnd = min(nMax, Int(ceil((rightLon + 180.0) / 360.0 * nMaxD)))
@@ -303,7 +292,7 @@ struct MKMapViewContainer: NSViewRepresentable {
             var newGrid: [MKPolyline] = []
             if xStart <= xEnd {
                 for x in xStart...xEnd {
-                    let lon = parent.lonForTileX(x, zoom: maxZoom)
+                    let lon = Tile.lonForTileX(x, zoom: maxZoom)
                     let lineCoords = [
                         CLLocationCoordinate2D(latitude: topLat, longitude: lon),
                         CLLocationCoordinate2D(latitude: bottomLat, longitude: lon)
@@ -313,7 +302,7 @@ struct MKMapViewContainer: NSViewRepresentable {
             }
             if yStart <= yEnd {
                 for y in yStart...yEnd {
-                    let lat = parent.latForTileY(y, zoom: maxZoom)
+                    let lat = Tile.latForTileY(y, zoom: maxZoom)
                     let lineCoords = [
                         CLLocationCoordinate2D(latitude: lat, longitude: leftLon),
                         CLLocationCoordinate2D(latitude: lat, longitude: rightLon)
@@ -387,7 +376,7 @@ struct ContentView: View {
     }
 
     private func tileCenterLatLon(x: Int, y: Int, z: Int) -> (lat: Double, lon: Double) {
-        let n = pow(2.0, Double(z))
+        let n = Double(1 << z)
         let lon = (Double(x) + 0.5) / n * 360.0 - 180.0
         let latRad = atan(sinh(Double.pi * (1.0 - 2.0 * (Double(y) + 0.5) / n)))
         let lat = latRad * 180.0 / Double.pi
@@ -637,6 +626,16 @@ struct ContentView: View {
                                         .foregroundStyle(.secondary)
                                     Spacer()
                                 }
+                                HStack {
+                                    Text("Downloads:")
+                                        .frame(width: 120, alignment: .trailing)
+                                    Stepper("\(viewModel.downloadWorkers)", value: $viewModel.downloadWorkers, in: 1...8)
+                                        .frame(maxWidth: 100)
+                                    Text("parallel connections")
+                                        .font(.caption)
+                                        .foregroundStyle(.secondary)
+                                    Spacer()
+                                }
                             }
                             .padding(8)
                         }
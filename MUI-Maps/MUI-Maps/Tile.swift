@@ -17,27 +17,78 @@ struct Tile: Identifiable, Hashable {
         "\(z)/\(x)/\(y)"
     }
     
+    /// Northernmost/southernmost latitude Web Mercator covers, atan(sinh(π)) in degrees
+    static let maxLatitude = 85.0511287798066
+    
+    /// Web Mercator position of lat/lon as a fraction of the world (0...1, y increasing southward).
+    /// Independent of zoom, so callers covering several zooms do the trig once.
+    static func mercatorFraction(lat: Double, lon: Double) -> (x: Double, y: Double) {
+        // Clamp to the Web Mercator limit: toward the poles tan φ + sec φ reaches 0 or ∞,
+        // and the resulting infinite y would trap when converted to a tile index
+        let latRad = min(max(lat, -maxLatitude), maxLatitude) * .pi / 180.0
+        // Same projection form as the map overlay's tileXY
+        return ((lon + 180.0) / 360.0, (1.0 - log(tan(latRad) + 1.0 / cos(latRad)) / .pi) / 2.0)
+    }
+    
+    /// Tile containing a Mercator fraction at given zoom level
+    private static func tileNum(_ fraction: (x: Double, y: Double), zoom: Int) -> (x: Int, y: Int) {
+        let n = Double(1 << zoom)  // exact power of two without a pow() call
+        return (Int(fraction.x * n), Int(fraction.y * n))
+    }
+    
     /// Convert lat/lon to tile coordinates at given zoom level
     static func deg2num(lat: Double, lon: Double, zoom: Int) -> (x: Int, y: Int) {
-        let latRad = lat * .pi / 180.0
-        let n = pow(2.0, Double(zoom))
-        let xtile = Int((lon + 180.0) / 360.0 * n)
-        let ytile = Int((1.0 - asinh(tan(latRad)) / .pi) / 2.0 * n)
-        return (xtile, ytile)
+        tileNum(mercatorFraction(lat: lat, lon: lon), zoom: zoom)
+    }
+    
+    /// Longitude of the west edge of tile column `x`
+    static func lonForTileX(_ x: Int, zoom: Int) -> Double {
+        let n = Double(1 << zoom)
+        return (Double(x) / n) * 360.0 - 180.0
+    }
+    
+    /// Latitude of the north edge of tile row `y`
+    static func latForTileY(_ y: Int, zoom: Int) -> Double {
+        let n = Double(1 << zoom)
+        let latRad = atan(sinh(.pi * (1.0 - 2.0 * Double(y) / n)))
+        return latRad * 180.0 / .pi
+    }
+    
+    /// Geographic bounds of the (2r+1)×(2r+1) block around a center point at `zoom`
+    static func bboxAround(
+        lat: Double,
+        lon: Double,
+        zoom: Int,
+        radius: Int
+    ) -> (west: Double, south: Double, east: Double, north: Double) {
+        let (cx, cy) = deg2num(lat: lat, lon: lon, zoom: zoom)
+        return (west: lonForTileX(cx - radius, zoom: zoom),
+                south: latForTileY(cy + radius + 1, zoom: zoom),
+                east: lonForTileX(cx + radius + 1, zoom: zoom),
+                north: latForTileY(cy - radius, zoom: zoom))
+    }
+    
+    /// One range per zoom covering the area that `radius` spans around a center point at the
+    /// lowest zoom, so deeper zooms fetch the same ground rather than a smaller area
+    static func rangesAround(lat: Double, lon: Double, zooms: ClosedRange<Int>, radius: Int) -> [TileRange] {
+        let bbox = bboxAround(lat: lat, lon: lon, zoom: zooms.lowerBound, radius: radius)
+        // The corners' Mercator fractions hold for every zoom; only the scale changes
+        let topLeft = mercatorFraction(lat: bbox.north, lon: bbox.west)
+        let bottomRight = mercatorFraction(lat: bbox.south, lon: bbox.east)
+        return zooms.map { z in
+            range(zoom: z, topLeft: topLeft, bottomRight: bottomRight)
+        }
     }
     
     /// Get all tiles in a radius around a center point
     static func tilesAround(lat: Double, lon: Double, zoom: Int, radius: Int) -> [Tile] {
+        Array(rangeAround(lat: lat, lon: lon, zoom: zoom, radius: radius))
+    }
+    
+    /// The (2r+1)×(2r+1) block of tiles around a center point, without building each tile
+    static func rangeAround(lat: Double, lon: Double, zoom: Int, radius: Int) -> TileRange {
         let (cx, cy) = deg2num(lat: lat, lon: lon, zoom: zoom)
-        var tiles: [Tile] = []
-        
-        for dx in -radius...radius {
-            for dy in -radius...radius {
-                tiles.append(Tile(z: zoom, x: cx + dx, y: cy + dy))
-            }
-        }
-        
-        return tiles
+        return TileRange(z: zoom, xs: (cx - radius)...(cx + radius), ys: (cy - radius)...(cy + radius))
     }
     
     /// Get all tiles within a bounding box at given zoom level
@@ -48,23 +99,50 @@ struct Tile: Identifiable, Hashable {
         east: Double,
         north: Double
     ) -> [Tile] {
-        // deg2num expects lat, lon. y increases southward
-        let (x1, y1) = deg2num(lat: north, lon: west, zoom: zoom)  // top-left
-        let (x2, y2) = deg2num(lat: south, lon: east, zoom: zoom)  // bottom-right
-        
-        let xmin = min(x1, x2)
-        let xmax = max(x1, x2)
-        let ymin = min(y1, y2)
-        let ymax = max(y1, y2)
-        
-        var tiles: [Tile] = []
-        for x in xmin...xmax {
-            for y in ymin...ymax {
-                tiles.append(Tile(z: zoom, x: x, y: y))
-            }
-        }
-        
-        return tiles
+        Array(rangeForBBox(zoom: zoom, west: west, south: south, east: east, north: north))
+    }
+    
+    /// The block of tiles covering a bounding box at given zoom level, without building each tile
+    static func rangeForBBox(
+        zoom: Int,
+        west: Double,
+        south: Double,
+        east: Double,
+        north: Double
+    ) -> TileRange {
+        // y increases southward
+        range(zoom: zoom,
+              topLeft: mercatorFraction(lat: north, lon: west),
+              bottomRight: mercatorFraction(lat: south, lon: east))
+    }
+    
+    /// The block of tiles spanned by two corner Mercator fractions at given zoom level
+    private static func range(
+        zoom: Int,
+        topLeft: (x: Double, y: Double),
+        bottomRight: (x: Double, y: Double)
+    ) -> TileRange {
+        let (x1, y1) = tileNum(topLeft, zoom: zoom)
+        let (x2, y2) = tileNum(bottomRight, zoom: zoom)
+        return TileRange(z: zoom, xs: min(x1, x2)...max(x1, x2), ys: min(y1, y2)...max(y1, y2))
+    }
+}
+
+/// A rectangular block of tiles at one zoom level, stored as its bounds.
+/// Tiles are produced on demand in column order (x outer, y inner), and
+/// `count` is O(1), so estimates never allocate the grid.
+struct TileRange: RandomAccessCollection, Hashable {
+    let z: Int
+    let xs: ClosedRange<Int>
+    let ys: ClosedRange<Int>
+    
+    var startIndex: Int { 0 }
+    var endIndex: Int { xs.count * ys.count }
+    
+    subscript(position: Int) -> Tile {
+        precondition(indices.contains(position), "TileRange index out of range")
+        let (column, row) = position.quotientAndRemainder(dividingBy: ys.count)
+        return Tile(z: z, x: xs.lowerBound + column, y: ys.lowerBound + row)
     }
 }
 
@@ -95,3 +173,60 @@ enum TileStyle: String, CaseIterable, Identifiable {
         }
     }
 }
+
+/// A tile URL template parsed once into literal segments and placeholders,
+/// so each tile URL is built in one pass instead of four string scans
+nonisolated struct TileURLTemplate: Sendable {
+    private enum Part: Sendable {
+        case literal(String)
+        case subdomain
+        case z, x, y
+    }
+    
+    private static let subdomains = ["a", "b", "c", "d"]
+    private let parts: [Part]
+    
+    /// Parse a template using `{s}`, `{z}`, `{x}` and `{y}` placeholders
+    init(_ template: String) {
+        var parts: [Part] = []
+        var rest = Substring(template)
+        while let open = rest.firstIndex(of: "{"),
+              let close = rest[open...].firstIndex(of: "}") {
+            if open > rest.startIndex {
+                parts.append(.literal(String(rest[..<open])))
+            }
+            switch rest[rest.index(after: open)..<close] {
+            case "s": parts.append(.subdomain)
+            case "z": parts.append(.z)
+            case "x": parts.append(.x)
+            case "y": parts.append(.y)
+            default: parts.append(.literal(String(rest[open...close])))
+            }
+            rest = rest[rest.index(after: close)...]
+        }
+        if !rest.isEmpty {
+            parts.append(.literal(String(rest)))
+        }
+        self.parts = parts
+    }
+    
+    /// Build the URL for one tile. The subdomain, if the template has one, is derived from
+    /// the tile coordinates (the Leaflet convention), so a tile always maps to the same URL
+    /// and the persistent HTTP cache can hit across runs.
+    func url(z: Int, x: Int, y: Int) -> URL? {
+        var string = ""
+        string.reserveCapacity(96)
+        for part in parts {
+            switch part {
+            case .literal(let text): string += text
+            case .subdomain:
+                let count = Self.subdomains.count
+                string += Self.subdomains[((x + y) % count + count) % count]
+            case .z: string += String(z)
+            case .x: string += String(x)
+            case .y: string += String(y)
+            }
+        }
+        return URL(string: string)
+    }
+}
@@ -6,46 +6,64 @@
 //
 
 import Foundation
-import AppKit
+import CoreGraphics
+import ImageIO
 
 /// Service for converting PNG tiles to LVGL RGB565 binary format
 /// Swift-native: writes the LVGL BIN header + RGB565 pixels (no Python dependency).
-final class TileConverter {
+/// Stateless and nonisolated so conversions can run in parallel off the main actor.
+nonisolated final class TileConverter: Sendable {
+    
+    /// Created once and shared by every conversion instead of once per tile
+    private static let deviceRGB = CGColorSpaceCreateDeviceRGB()
+    
+    /// Size of the LVGL v9 image header in bytes
+    private static let headerSize = 12
     
     /// LVGL header layout (v9, little endian, 12 bytes total):
     /// magic (0x19), cf (0x12 = RGB565), flags (u16), width (u16), height (u16), stride (u16), reserved (u16)
     /// followed by RGB565 little-endian pixel data
-    private func writeLVGLBin(pixelsRGB565: Data, width: Int, height: Int, to url: URL) throws {
+    static func lvglHeader(width: Int, height: Int) throws -> [UInt8] {
         guard width <= 0xFFFF && height <= 0xFFFF else {
             throw ConverterError.invalidImage
         }
         let magic: UInt8 = 0x19
         let cf: UInt8 = 0x12 // ColorFormat.RGB565
         let flags: UInt16 = 0
-        let stride: UInt16 = UInt16(width * 2) // bytes per row for RGB565
-        var out = Data()
-        out.reserveCapacity(12 + pixelsRGB565.count)
-        out.append(magic)
-        out.append(cf)
-        out.append(contentsOf: withUnsafeBytes(of: flags.littleEndian, Array.init))
-        out.append(contentsOf: withUnsafeBytes(of: UInt16(width).littleEndian, Array.init))
-        out.append(contentsOf: withUnsafeBytes(of: UInt16(height).littleEndian, Array.init))
-        out.append(contentsOf: withUnsafeBytes(of: stride.littleEndian, Array.init))
-        out.append(contentsOf: withUnsafeBytes(of: UInt16(0).littleEndian, Array.init)) // reserved
-        out.append(pixelsRGB565)
-        try out.write(to: url)
+        let stride = UInt16(width * 2) // bytes per row for RGB565
+        var header = [UInt8](repeating: 0, count: headerSize)
+        header.withUnsafeMutableBytes { buffer in
+            buffer[0] = magic
+            buffer[1] = cf
+            buffer.storeBytes(of: flags.littleEndian, toByteOffset: 2, as: UInt16.self)
+            buffer.storeBytes(of: UInt16(width).littleEndian, toByteOffset: 4, as: UInt16.self)
+            buffer.storeBytes(of: UInt16(height).littleEndian, toByteOffset: 6, as: UInt16.self)
+            buffer.storeBytes(of: stride.littleEndian, toByteOffset: 8, as: UInt16.self)
+            buffer.storeBytes(of: UInt16(0).littleEndian, toByteOffset: 10, as: UInt16.self) // reserved
+        }
+        return header
     }
+    
+    /// Every standard 256×256 tile shares the same header, so build it once
+    private static let tile256Header = try! lvglHeader(width: 256, height: 256)
 
-    /// Convert PNG to RGB565 pixel buffer + LVGL BIN wrapper
-    private func convertPNGToRGB565Bin(pngPath: URL, binPath: URL) throws -> Bool {
-        // Create parent directories
-        let parentDir = binPath.deletingLastPathComponent()
-        try FileManager.default.createDirectory(at: parentDir, withIntermediateDirectories: true)
-        // Load the PNG image
-        guard let nsImage = NSImage(contentsOf: pngPath),
-              let cgImage = nsImage.cgImage(forProposedRect: nil, context: nil, hints: nil) else {
+    /// Decode the first frame of an image directly through ImageIO
+    /// (skips the NSImage wrapper and its per-image representation cache).
+    /// ImageIO is the system's SIMD-accelerated PNG/JPEG decoder; each tile is drawn
+    /// exactly once, so its decoded-image cache is disabled.
+    private func decodeImage(from source: CGImageSource?) throws -> CGImage {
+        let options = [kCGImageSourceShouldCache: false] as CFDictionary
+        guard let source,
+              let image = CGImageSourceCreateImageAtIndex(source, 0, options) else {
             throw ConverterError.invalidImage
         }
+        return image
+    }
+
+    /// Convert a decoded-on-demand image to RGB565 pixel buffer + LVGL BIN wrapper.
+    /// The caller creates `binPath`'s directory (once per tile column, not per tile).
+    private func convertToRGB565Bin(source: CGImageSource?, binPath: URL) throws -> Bool {
+        let cgImage = try decodeImage(from: source)
         let width = cgImage.width
         let height = cgImage.height
         guard let context = CGContext(
@@ -54,7 +72,7 @@ final class TileConverter {
             height: height,
             bitsPerComponent: 8,
             bytesPerRow: width * 4,
-            space: CGColorSpaceCreateDeviceRGB(),
+            space: Self.deviceRGB,
             bitmapInfo: CGImageAlphaInfo.premultipliedLast.rawValue
         ) else {
             throw ConverterError.contextCreationFailed
@@ -63,36 +81,66 @@ final class TileConverter {
         guard let pixelData = context.data else {
             throw ConverterError.noPixelData
         }
-        var rgb565Data = Data()
-        rgb565Data.reserveCapacity(width * height * 2)
-        let pixels = pixelData.bindMemory(to: UInt8.self, capacity: width * height * 4)
-        for y in 0..<height {
-            for x in 0..<width {
-                let offset = (y * width + x) * 4
-                let r = pixels[offset]
-                let g = pixels[offset + 1]
-                let b = pixels[offset + 2]
-                let r5 = UInt16(r >> 3) & 0x1F
-                let g6 = UInt16(g >> 2) & 0x3F
-                let b5 = UInt16(b >> 3) & 0x1F
-                let rgb565 = (r5 << 11) | (g6 << 5) | b5
-                rgb565Data.append(UInt8(rgb565 & 0xFF))
-                rgb565Data.append(UInt8(rgb565 >> 8))
-            }
+        let header = try (width == 256 && height == 256)
+            ? Self.tile256Header
+            : Self.lvglHeader(width: width, height: height)
+        // Header and pixels share one buffer, written to disk in a single call
+        var out = Data(count: Self.headerSize + width * height * 2)
+        out.withUnsafeMutableBytes { buffer in
+            header.withUnsafeBytes { buffer.copyMemory(from: $0) }
+            Self.packRGB565(from: pixelData,
+                            to: buffer.baseAddress! + Self.headerSize,
+                            pixelCount: width * height)
+        }
+        // Atomic so an interrupted run never leaves a truncated tile that looks complete
+        try out.write(to: binPath, options: .atomic)
+        // The atomic write either lands all of `out` or throws, so no need to stat it back
+        return out.count > 1024
+    }
+
+    /// Pack RGBA8888 pixels (R in the first byte) into little-endian RGB565.
+    /// Handles 16 pixels per step with SIMD vectors, then finishes the tail one pixel at a time.
+    /// Apple platforms are little-endian, so each RGBA pixel loads as a UInt32 with R in the low byte,
+    /// and one fused SWAR expression moves each channel's top bits straight into place:
+    /// R bits 3–7 → 11–15, G bits 10–15 → 5–10, B bits 19–23 → 0–4.
+    static func packRGB565(from src: UnsafeRawPointer, to dst: UnsafeMutableRawPointer, pixelCount: Int) {
+        let lanes = 16
+        var i = 0
+        while i + lanes <= pixelCount {
+            let px = src.loadUnaligned(fromByteOffset: i * 4, as: SIMD16<UInt32>.self)
+            let packed = ((px &<< 8) & 0xF800) | ((px &>> 5) & 0x07E0) | ((px &>> 19) & 0x001F)
+            dst.storeBytes(of: SIMD16<UInt16>(truncatingIfNeeded: packed), toByteOffset: i * 2, as: SIMD16<UInt16>.self)
+            i += lanes
+        }
+        while i < pixelCount {
+            let px = src.loadUnaligned(fromByteOffset: i * 4, as: UInt32.self)
+            let packed = ((px << 8) & 0xF800) | ((px >> 5) & 0x07E0) | ((px >> 19) & 0x001F)
+            dst.storeBytes(of: UInt16(truncatingIfNeeded: packed).littleEndian, toByteOffset: i * 2, as: UInt16.self)
+            i += 1
         }
-        try writeLVGLBin(pixelsRGB565: rgb565Data, width: width, height: height, to: binPath)
-        let attrs = try FileManager.default.attributesOfItem(atPath: binPath.path)
-        if let size = attrs[.size] as? Int64, size > 1024 { return true }
-        return false
     }
 
     /// Convert a PNG file to RGB565 .bin format for LVGL/MUI
     /// - Parameters:
     ///   - pngPath: Path to source PNG file
-    ///   - binPath: Path to destination .bin file
+    ///   - binPath: Path to destination .bin file; its directory must already exist
     /// - Returns: true if conversion successful
+    @concurrent
     func convertPNGToBin(pngPath: URL, binPath: URL) async throws -> Bool {
-        return try convertPNGToRGB565Bin(pngPath: pngPath, binPath: binPath)
+        return try convertToRGB565Bin(source: CGImageSourceCreateWithURL(pngPath as CFURL, nil),
+                                      binPath: binPath)
+    }
+    
+    /// Convert PNG bytes still in memory (straight from the download) to RGB565 .bin format,
+    /// so a fresh tile never round-trips through a PNG file on disk
+    /// - Parameters:
+    ///   - pngData: Encoded PNG image
+    ///   - binPath: Path to destination .bin file; its directory must already exist
+    /// - Returns: true if conversion successful
+    @concurrent
+    func convertPNGToBin(pngData: Data, binPath: URL) async throws -> Bool {
+        return try convertToRGB565Bin(source: CGImageSourceCreateWithData(pngData as CFData, nil),
+                                      binPath: binPath)
     }
     
     /// Delete a file if it exists
@@ -102,7 +150,7 @@ final class TileConverter {
 }
 
 /// Errors that can occur during tile conversion
-enum ConverterError: LocalizedError {
+nonisolated enum ConverterError: LocalizedError {
     case invalidImage
     case contextCreationFailed
     case noPixelData
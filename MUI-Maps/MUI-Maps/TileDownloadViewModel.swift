@@ -10,6 +10,27 @@ import SwiftUI
 import Combine
 import AppKit
 
+/// A tile moving through the download → convert pipeline
+nonisolated private struct TileJob: Sendable {
+    let label: String
+    let pngPath: URL  // PNG location in the output tree (kept or left by an earlier run)
+    let binPath: URL
+}
+
+/// Where a tile's PNG comes from when it is converted
+nonisolated private enum TilePNG: Sendable {
+    case data(Data)  // fresh download, still in memory
+    case file(URL)   // left in the output tree by an earlier run
+}
+
+/// Completion events reported by pipeline child tasks
+nonisolated private enum TilePipelineEvent: Sendable {
+    case downloaded(TileJob, png: TilePNG)
+    case downloadFailed(String)
+    case converted
+    case convertFailed(String)
+}
+
 /// Main view model coordinating tile download and conversion
 @MainActor
 class TileDownloadViewModel: ObservableObject {
@@ -22,6 +43,7 @@ class TileDownloadViewModel: ObservableObject {
     @Published var selectedStyle: TileStyle = .osm
     @Published var keepPNG: Bool = false
     @Published var delayMs: Int = 50
+    @Published var downloadWorkers: Int = 4  // concurrent downloads; keep small per provider usage policies
     @Published var includeWorld: Bool = false
     
     // Output settings
@@ -40,7 +62,6 @@ class TileDownloadViewModel: ObservableObject {
     @Published var statusMessage: String = ""
     @Published var errorMessage: String = ""
     
-    private let downloader = TileDownloader()
     private let converter = TileConverter()
     private var downloadTask: Task<Void, Never>?
     
@@ -50,6 +71,10 @@ class TileDownloadViewModel: ObservableObject {
             outputDirectory = downloads
         }
         self.maxZoom = max(self.maxZoom, self.zoom)
+        // Scripted or CI launches can preset the download pool size
+        if let workers = ProcessInfo.processInfo.environment["MUI_TILES_WORKERS"].flatMap({ Int($0) }) {
+            downloadWorkers = min(max(workers, 1), 8)
+        }
     }
     
     /// Calculate estimated tiles and size across a zoom range
@@ -75,49 +100,15 @@ class TileDownloadViewModel: ObservableObject {
 
         // If min==max, keep the previous simple path for performance
         if minZ == maxZ {
-            let tiles = Tile.tilesAround(lat: cLat, lon: cLon, zoom: minZ, radius: r)
-            let count = tiles.count
+            let count = Tile.rangeAround(lat: cLat, lon: cLon, zoom: minZ, radius: r).count
             let sizeMB = Double(count * 131_084) / (1024.0 * 1024.0)
             return (count, sizeMB)
         }
 
-        // Compute a geographic bounding box based on the min zoom radius around the center,
-        // then count tiles that intersect this same bbox at each zoom in [minZ, maxZ].
+        // Count tiles that intersect the min zoom radius's bbox at each zoom in [minZ, maxZ].
         // This mirrors the CLI wizard's approach and avoids undercounting.
-        func bboxFromCenterRadius(lat: Double, lon: Double, zoom: Int, radius: Int) -> (west: Double, south: Double, east: Double, north: Double) {
-            // Get center tile at min zoom
-            let (cx, cy) = Tile.deg2num(lat: lat, lon: lon, zoom: zoom)
-            // Compute inclusive tile bounds at min zoom
-            let xmin = cx - radius
-            let xmax = cx + radius
-            let ymin = cy - radius
-            let ymax = cy + radius
-
-            // Convert tile edges to geographic coordinates at min zoom
-            func lonForTileX(_ x: Int, z: Int) -> Double {
-                let n = pow(2.0, Double(z))
-                return (Double(x) / n) * 360.0 - 180.0
-            }
-            func latForTileY(_ y: Int, z: Int) -> Double {
-                let n = pow(2.0, Double(z))
-                let latRad = atan(sinh(.pi * (1.0 - 2.0 * Double(y) / n)))
-                return latRad * 180.0 / .pi
-            }
-
-            let west = lonForTileX(xmin, z: zoom)
-            let east = lonForTileX(xmax + 1, z: zoom)
-            let north = latForTileY(ymin, z: zoom)
-            let south = latForTileY(ymax + 1, z: zoom)
-            return (west, south, east, north)
-        }
-
-        let bbox = bboxFromCenterRadius(lat: cLat, lon: cLon, zoom: minZ, radius: r)
-
-        var total = 0
-        for z in minZ...maxZ {
-            let tilesAtZ = Tile.tilesForBBox(zoom: z, west: bbox.west, south: bbox.south, east: bbox.east, north: bbox.north)
-            total += tilesAtZ.count
-        }
+        let total = Tile.rangesAround(lat: cLat, lon: cLon, zooms: minZ...maxZ, radius: r)
+            .reduce(0) { $0 + $1.count }
         var adjustedTotal = total
         if includeWorld {
             // Add the single world tile at z=0
@@ -152,55 +143,25 @@ class TileDownloadViewModel: ObservableObject {
         progress = 0.0
         errorMessage = ""
 
-        // Build tiles across zoom range [zoom..maxZoom] using a bbox derived from min zoom + radius
-        let minZ = zoom
-        let maxZ = maxZoom
-        func bboxFromCenterRadius(lat: Double, lon: Double, zoom: Int, radius: Int) -> (west: Double, south: Double, east: Double, north: Double) {
-            // Center tile at min zoom
-            let (cx, cy) = Tile.deg2num(lat: lat, lon: lon, zoom: zoom)
-            let xmin = cx - radius
-            let xmax = cx + radius
-            let ymin = cy - radius
-            let ymax = cy + radius
-            func lonForTileX(_ x: Int, z: Int) -> Double {
-                let n = pow(2.0, Double(z))
-                return (Double(x) / n) * 360.0 - 180.0
-            }
-            func latForTileY(_ y: Int, z: Int) -> Double {
-                let n = pow(2.0, Double(z))
-                let latRad = atan(sinh(.pi * (1.0 - 2.0 * Double(y) / n)))
-                return latRad * 180.0 / .pi
-            }
-            let west = lonForTileX(xmin, z: zoom)
-            let east = lonForTileX(xmax + 1, z: zoom)
-            let north = latForTileY(ymin, z: zoom)
-            let south = latForTileY(ymax + 1, z: zoom)
-            return (west, south, east, north)
-        }
-
-        let bbox = bboxFromCenterRadius(lat: lat, lon: lon, zoom: minZ, radius: radius)
-        var allTiles: [Tile] = []
-        for z in minZ...maxZ {
-            let tz = Tile.tilesForBBox(zoom: z, west: bbox.west, south: bbox.south, east: bbox.east, north: bbox.north)
-            allTiles.append(contentsOf: tz)
-        }
+        // Build tiles across zoom range [zoom..maxZoom] using a bbox derived from min zoom + radius.
+        // Each zoom stays a TileRange, so a wide high-zoom area is never held as one huge array
+        var ranges = Tile.rangesAround(lat: lat, lon: lon, zooms: zoom...maxZoom, radius: radius)
 
         // Optionally include the single world tile (z=0, x=0, y=0) separately from the min-max range
         if includeWorld {
-            let worldTile = Tile(z: 0, x: 0, y: 0)
             // Avoid duplicates if minZoom is 0 and already included
-            if !allTiles.contains(where: { $0.z == 0 && $0.x == 0 && $0.y == 0 }) {
-                allTiles.insert(worldTile, at: 0)
+            if !ranges.contains(where: { $0.z == 0 && $0.xs.contains(0) && $0.ys.contains(0) }) {
+                ranges.insert(TileRange(z: 0, xs: 0...0, ys: 0...0), at: 0)
             }
         }
 
-        totalTiles = allTiles.count
+        totalTiles = ranges.reduce(0) { $0 + $1.count }
         statusMessage = "Starting download of \(totalTiles) tiles..."
         isDownloading = true
 
-        let tiles = allTiles
+        let tileRanges = ranges
         downloadTask = Task {
-            await processTiles(tiles, outputDir: outputDir)
+            await processTiles(tileRanges, outputDir: outputDir)
         }
     }
     
@@ -213,107 +174,226 @@ class TileDownloadViewModel: ObservableObject {
     }
     
     /// Process all tiles: download PNG and convert to bin
-    private func processTiles(_ tiles: [Tile], outputDir: URL) async {
+    /// Producer/consumer pipeline: a small pool of paced downloads feeds a queue of
+    /// conversions (up to one per core), so network latency hides behind CPU work.
+    private func processTiles(_ ranges: [TileRange], outputDir: URL) async {
         let mapRoot = outputDir
             .appendingPathComponent("maps")
             .appendingPathComponent(selectedStyle.folderName)
-        let urlTemplate = selectedStyle.urlTemplate
+        let urlTemplate = TileURLTemplate(selectedStyle.urlTemplate)
+        let maxDownloads = min(max(downloadWorkers, 1), 8)
+        let keepPNG = self.keepPNG
+        let downloader = TileDownloader(maxConnectionsPerHost: maxDownloads)
+        let converter = self.converter
+        let pacer = RequestPacer(delayMs: delayMs)
+        let index = TileDirectoryIndex()
+        let maxConversions = max(1, ProcessInfo.processInfo.activeProcessorCount)
+        let maxQueued = 64
+        
+        // Counters accumulate locally and are published at most a few times per second:
+        // every @Published write re-renders the whole panel
+        let clock = ContinuousClock()
+        let publishInterval = Duration.milliseconds(250)
+        var lastPublish = clock.now
+        var latestTile = ""
+        var downloaded = 0
+        var converted = 0
+        var failed = 0
+        var lastError: String?
+        
+        func publishProgress(force: Bool = false) {
+            let now = clock.now
+            guard force || now - lastPublish >= publishInterval else { return }
+            lastPublish = now
+            currentTile = latestTile
+            downloadedCount = downloaded
+            convertedCount = converted
+            failedCount = failed
+            if let lastError {
+                errorMessage = lastError
+            }
+            progress = Double(converted + failed) / Double(totalTiles)
+            statusMessage = "Downloaded: \(downloaded), Converted: \(converted), Failed: \(failed)"
+        }
+        
+        // Record a finished tile (converted, or failed at either stage)
+        func finishTile(error: String?) {
+            if let error {
+                failed += 1
+                lastError = error
+            } else {
+                converted += 1
+            }
+            publishProgress()
+        }
+        
+        // Explicit directory hints keep URL building off the disk
+        func columnURL(z: Int, x: Int) -> URL {
+            mapRoot
+                .appending(component: "\(z)", directoryHint: .isDirectory)
+                .appending(component: "\(x)", directoryHint: .isDirectory)
+        }
         
-        for (index, tile) in tiles.enumerated() {
-            // Check for cancellation
-            if Task.isCancelled {
-                await MainActor.run {
-                    statusMessage = "Download cancelled"
-                    isDownloading = false
+        // One listing per existing column finds the tiles an earlier run already converted,
+        // so a re-run skips them without spawning a task or touching the network
+        statusMessage = "Checking existing tiles..."
+        var convertedRows: [Int: [Int: Set<Int>]] = [:]
+        for range in ranges where !Task.isCancelled {
+            for x in range.xs where !Task.isCancelled {
+                let rows = await index.convertedRows(
+                    inColumn: columnURL(z: range.z, x: x),
+                    minSize: 1024,
+                    requirePNG: keepPNG  // a kept PNG must exist too, or the tile is fetched again
+                )
+                if !rows.isEmpty {
+                    convertedRows[range.z, default: [:]][x] = rows
                 }
-                return
             }
+        }
+        
+        await withTaskGroup(of: TilePipelineEvent.self) { group in
+            var pending = ranges.joined().makeIterator()
+            var downloadsInFlight = 0
+            var conversionsInFlight = 0
+            var conversionQueue: [(job: TileJob, png: TilePNG)] = []
             
-            await MainActor.run {
-                currentTile = "\(tile.z)/\(tile.x)/\(tile.y)"
+            // Tiles arrive column by column, so one cached z/x directory serves a whole
+            // run of y values, and it is created here once per column rather than per tile
+            var column: (z: Int, x: Int, dir: URL)?
+            func columnDirectory(z: Int, x: Int) -> URL {
+                if let column, column.z == z, column.x == x { return column.dir }
+                let dir = columnURL(z: z, x: x)
+                // A failure here surfaces as a write error on each tile in the column
+                try? FileManager.default.createDirectory(at: dir, withIntermediateDirectories: true)
+                column = (z, x, dir)
+                return dir
             }
             
-            let pngPath = mapRoot
-                .appendingPathComponent("\(tile.z)")
-                .appendingPathComponent("\(tile.x)")
-                .appendingPathComponent("\(tile.y).png")
-            
-            let binPath = mapRoot
-                .appendingPathComponent("\(tile.z)")
-                .appendingPathComponent("\(tile.x)")
-                .appendingPathComponent("\(tile.y).bin")
-            
-            // Download PNG
-            do {
-                let downloaded = try await downloader.downloadTile(
-                    tile: tile,
-                    urlTemplate: urlTemplate,
-                    outputPath: pngPath
+            // Start the next download, if any remain and the queue has room
+            @discardableResult
+            func startNextDownload() -> Bool {
+                guard !Task.isCancelled, conversionQueue.count < maxQueued else { return false }
+                var next = pending.next()
+                // A sane .bin from an earlier run needs neither a download nor a conversion
+                while let tile = next, convertedRows[tile.z]?[tile.x]?.contains(tile.y) == true {
+                    finishTile(error: nil)
+                    next = pending.next()
+                }
+                guard let tile = next else { return false }
+                
+                let tileDir = columnDirectory(z: tile.z, x: tile.x)
+                let job = TileJob(
+                    label: "\(tile.z)/\(tile.x)/\(tile.y)",
+                    pngPath: tileDir.appending(component: "\(tile.y).png", directoryHint: .notDirectory),
+                    binPath: tileDir.appending(component: "\(tile.y).bin", directoryHint: .notDirectory)
                 )
+                latestTile = job.label
+                downloadsInFlight += 1
                 
-                if downloaded {
-                    await MainActor.run {
-                        downloadedCount += 1
+                group.addTask {
+                    // Reuse a PNG left by an earlier run instead of fetching it again
+                    if let size = await index.fileSize(at: job.pngPath), size > 256 {
+                        return .downloaded(job, png: .file(job.pngPath))
                     }
-                    
-                    // Convert to bin
-                    let converted = try await converter.convertPNGToBin(
-                        pngPath: pngPath,
-                        binPath: binPath
-                    )
-                    
-                    if converted {
-                        await MainActor.run {
-                            convertedCount += 1
+                    // Politeness: space out request starts across all workers
+                    await pacer.waitForTurn()
+                    do {
+                        let data = try await downloader.downloadTile(tile: tile, urlTemplate: urlTemplate)
+                        // The converter decodes from memory; the PNG only reaches disk when kept
+                        if keepPNG {
+                            try data.write(to: job.pngPath)
                         }
-                        
-                        // Delete PNG if not keeping it
-                        if !keepPNG {
-                            converter.deleteFile(at: pngPath)
+                        return .downloaded(job, png: .data(data))
+                    } catch {
+                        return .downloadFailed(error.localizedDescription)
+                    }
+                }
+                return true
+            }
+            
+            // Convert to bin off the main actor
+            func startConversion(_ job: TileJob, png: TilePNG) {
+                conversionsInFlight += 1
+                group.addTask {
+                    do {
+                        let converted: Bool
+                        switch png {
+                        case .data(let data):
+                            converted = try await converter.convertPNGToBin(pngData: data, binPath: job.binPath)
+                        case .file(let url):
+                            converted = try await converter.convertPNGToBin(pngPath: url, binPath: job.binPath)
                         }
-                    } else {
-                        await MainActor.run {
-                            failedCount += 1
-                            errorMessage = "Conversion failed for tile \(tile.z)/\(tile.x)/\(tile.y)"
+                        guard converted else {
+                            return .convertFailed("Conversion failed for tile \(job.label)")
                         }
+                        // Delete a PNG left by an earlier run if not keeping it
+                        if !keepPNG, case .file(let url) = png {
+                            converter.deleteFile(at: url)
+                        }
+                        return .converted
+                    } catch {
+                        return .convertFailed(error.localizedDescription)
                     }
-                } else {
-                    await MainActor.run {
-                        failedCount += 1
-                        errorMessage = "Download failed for tile \(tile.z)/\(tile.x)/\(tile.y)"
-                    }
-                }
-            } catch {
-                await MainActor.run {
-                    failedCount += 1
-                    errorMessage = error.localizedDescription
                 }
             }
             
-            // Update progress
-            await MainActor.run {
-                progress = Double(index + 1) / Double(totalTiles)
-                statusMessage = "Downloaded: \(downloadedCount), Converted: \(convertedCount), Failed: \(failedCount)"
+            for _ in 0..<maxDownloads {
+                startNextDownload()
             }
             
-            // Delay between requests (politeness)
-            if delayMs > 0 {
-                try? await Task.sleep(nanoseconds: UInt64(delayMs) * 1_000_000)
+            while let event = await group.next() {
+                switch event {
+                case .downloaded(let job, let png):
+                    downloadsInFlight -= 1
+                    downloaded += 1
+                    if conversionsInFlight < maxConversions {
+                        startConversion(job, png: png)
+                    } else {
+                        conversionQueue.append((job, png))
+                    }
+                case .downloadFailed(let error):
+                    downloadsInFlight -= 1
+                    finishTile(error: error)
+                case .converted:
+                    conversionsInFlight -= 1
+                    finishTile(error: nil)
+                case .convertFailed(let error):
+                    conversionsInFlight -= 1
+                    finishTile(error: error)
+                }
+                
+                if Task.isCancelled {
+                    group.cancelAll()
+                    continue
+                }
+                while conversionsInFlight < maxConversions, !conversionQueue.isEmpty {
+                    let next = conversionQueue.removeFirst()
+                    startConversion(next.job, png: next.png)
+                }
+                // Adaptive window: shrinks while the server is throttling, recovers afterwards
+                let downloadLimit = await downloader.concurrency.limit
+                while downloadsInFlight < downloadLimit, startNextDownload() {}
             }
         }
         
-        await MainActor.run {
+        publishProgress(force: true)
+        
+        if Task.isCancelled {
+            statusMessage = "Download cancelled"
             isDownloading = false
-            statusMessage = "Complete! Downloaded: \(downloadedCount), Converted: \(convertedCount), Failed: \(failedCount)"
-            
-            if failedCount == 0 {
-                let alert = NSAlert()
-                alert.messageText = "Download Complete"
-                alert.informativeText = "Successfully converted \(convertedCount) tiles to \(mapRoot.path)"
-                alert.alertStyle = .informational
-                alert.addButton(withTitle: "OK")
-                alert.runModal()
-            }
+            return
+        }
+        
+        isDownloading = false
+        statusMessage = "Complete! Downloaded: \(downloadedCount), Converted: \(convertedCount), Failed: \(failedCount)"
+        
+        if failedCount == 0 {
+            let alert = NSAlert()
+            alert.messageText = "Download Complete"
+            alert.informativeText = "Successfully converted \(convertedCount) tiles to \(mapRoot.path)"
+            alert.alertStyle = .informational
+            alert.addButton(withTitle: "OK")
+            alert.runModal()
         }
     }
     
@@ -9,46 +9,51 @@ import Foundation
 import AppKit
 
 /// Service for downloading map tiles from tile servers
-actor TileDownloader {
+/// Holds only immutable state, so concurrent downloads run in parallel rather than
+/// queueing on a single actor (URLSession itself is thread-safe).
+nonisolated final class TileDownloader: Sendable {
     private let session: URLSession
     private let userAgent = "mui-tiles/0.1 (Meshtastic MUI bin tile tool)"
     
-    init() {
+    /// Adaptive window the download pipeline checks before starting another request
+    let concurrency: AdaptiveConcurrency
+    
+    /// Persistent HTTP cache shared by every run. Repeat downloads of an area are served
+    /// from disk, or revalidated with If-None-Match / If-Modified-Since (a 304 instead of the PNG).
+    private static let tileCache = URLCache(
+        memoryCapacity: 8 * 1024 * 1024,
+        diskCapacity: 1024 * 1024 * 1024,
+        directory: FileManager.default.urls(for: .cachesDirectory, in: .userDomainMask).first?
+            .appendingPathComponent("TileCache", isDirectory: true)
+    )
+    
+    /// - Parameter maxConnectionsPerHost: keep-alive pool size; match it to the number of
+    ///   concurrent downloads so workers reuse warm connections instead of new TLS handshakes.
+    ///   URLSession negotiates HTTP/2 via ALPN where the server supports it.
+    init(maxConnectionsPerHost: Int = 4) {
         let config = URLSessionConfiguration.default
         config.httpAdditionalHeaders = ["User-Agent": userAgent]
         config.timeoutIntervalForRequest = 20
+        config.urlCache = Self.tileCache
+        config.requestCachePolicy = .useProtocolCachePolicy
+        config.httpMaximumConnectionsPerHost = max(1, maxConnectionsPerHost)
         self.session = URLSession(configuration: config)
+        self.concurrency = AdaptiveConcurrency(maxLimit: maxConnectionsPerHost)
+    }
+    
+    deinit {
+        session.finishTasksAndInvalidate()
     }
     
     /// Download a single tile from the URL template
+    /// - Returns: the validated PNG bytes; callers decide whether they ever touch the disk
+    @concurrent
     func downloadTile(
         tile: Tile,
-        urlTemplate: String,
-        outputPath: URL,
+        urlTemplate: TileURLTemplate,
         retries: Int = 3
-    ) async throws -> Bool {
-        // Create parent directories if needed
-        let parentDir = outputPath.deletingLastPathComponent()
-        try FileManager.default.createDirectory(at: parentDir, withIntermediateDirectories: true)
-        
-        // Skip if already exists and has reasonable size
-        if FileManager.default.fileExists(atPath: outputPath.path) {
-            if let attrs = try? FileManager.default.attributesOfItem(atPath: outputPath.path),
-               let size = attrs[.size] as? Int64,
-               size > 256 {
-                return true
-            }
-        }
-        
-        // Substitute subdomain if present
-        let subdomain = ["a", "b", "c", "d"].randomElement() ?? "a"
-        let urlString = urlTemplate
-            .replacingOccurrences(of: "{s}", with: subdomain)
-            .replacingOccurrences(of: "{z}", with: "\(tile.z)")
-            .replacingOccurrences(of: "{x}", with: "\(tile.x)")
-            .replacingOccurrences(of: "{y}", with: "\(tile.y)")
-        
-        guard let url = URL(string: urlString) else {
+    ) async throws -> Data {
+        guard let url = urlTemplate.url(z: tile.z, x: tile.x, y: tile.y) else {
             throw TileError.invalidURL
         }
         
@@ -65,23 +70,32 @@ actor TileDownloader {
                 if httpResponse.statusCode == 200, !data.isEmpty {
                     // Validate it's actually PNG data
                     if data.count > 256 || isPNG(data) {
-                        try data.write(to: outputPath)
-                        return true
+                        await concurrency.recordSuccess()
+                        return data
                     } else {
                         throw TileError.invalidImageData
                     }
                 } else if [429, 500, 502, 503, 504].contains(httpResponse.statusCode) {
-                    // Retry on server errors
-                    try await Task.sleep(nanoseconds: UInt64(0.7 * Double(attempt) * 1_000_000_000))
+                    // Back off the whole pipeline when the server says it is overloaded
+                    if httpResponse.statusCode == 429 || httpResponse.statusCode == 503 {
+                        await concurrency.recordThrottle()
+                    }
+                    // Retry on server errors, waiting as long as the server asks if it says
                     lastError = TileError.serverError(httpResponse.statusCode)
+                    if attempt < retries {
+                        let wait = Self.retryAfter(httpResponse) ?? Self.backoff(attempt: attempt)
+                        try await Task.sleep(for: wait)
+                    }
                     continue
                 } else {
                     throw TileError.httpError(httpResponse.statusCode)
                 }
+            } catch let error as CancellationError {
+                throw error
             } catch {
                 lastError = error
                 if attempt < retries {
-                    try await Task.sleep(nanoseconds: UInt64(0.7 * Double(attempt) * 1_000_000_000))
+                    try await Task.sleep(for: Self.backoff(attempt: attempt))
                 }
             }
         }
@@ -89,6 +103,44 @@ actor TileDownloader {
         throw lastError ?? TileError.unknownError
     }
     
+    /// Exponential backoff with jitter: a random wait up to 0.5 s, 1 s, 2 s … (capped at 10 s),
+    /// so workers that failed together do not retry in lockstep and re-trigger the throttle
+    static func backoff(attempt: Int) -> Duration {
+        let base = 0.5
+        let cap = 10.0
+        let ceiling = min(cap, base * Double(1 << min(max(attempt - 1, 0), 16)))
+        return .seconds(Double.random(in: base / 2...max(base / 2, ceiling)))
+    }
+    
+    /// Delay requested by a `Retry-After` header, in delta-seconds or HTTP-date form, capped at a minute
+    static func retryAfter(_ response: HTTPURLResponse) -> Duration? {
+        guard let value = response.value(forHTTPHeaderField: "Retry-After")?
+            .trimmingCharacters(in: .whitespaces) else {
+            return nil
+        }
+        let seconds: Double
+        // RFC 9110 delta-seconds are digits only; this also keeps "nan"/"inf" out of Duration
+        if !value.isEmpty, value.utf8.allSatisfy({ $0 >= UInt8(ascii: "0") && $0 <= UInt8(ascii: "9") }) {
+            guard let delta = Double(value), delta.isFinite else { return nil }
+            seconds = delta
+        } else if let date = httpDateFormatter.date(from: value) {
+            seconds = date.timeIntervalSinceNow
+        } else {
+            return nil
+        }
+        return .seconds(min(max(seconds, 0), 60))
+    }
+    
+    /// IMF-fixdate parser for `Retry-After: Wed, 21 Oct 2015 07:28:00 GMT`
+    /// (DateFormatter is thread-safe for parsing once configured)
+    nonisolated(unsafe) private static let httpDateFormatter: DateFormatter = {
+        let formatter = DateFormatter()
+        formatter.locale = Locale(identifier: "en_US_POSIX")
+        formatter.timeZone = TimeZone(identifier: "GMT")
+        formatter.dateFormat = "EEE, dd MMM yyyy HH:mm:ss zzz"
+        return formatter
+    }()
+    
     /// Check if data starts with PNG signature
     private func isPNG(_ data: Data) -> Bool {
         let pngSignature: [UInt8] = [0x89, 0x50, 0x4E, 0x47, 0x0D, 0x0A, 0x1A, 0x0A]
@@ -97,8 +149,109 @@ actor TileDownloader {
     }
 }
 
+/// AIMD concurrency window for downloads (TCP-style): halves when the server throttles
+/// with 429/503, and grows by one after a full window of clean responses, up to `maxLimit`
+actor AdaptiveConcurrency {
+    private let maxLimit: Int
+    private(set) var limit: Int
+    private var successStreak = 0
+    
+    init(maxLimit: Int) {
+        self.maxLimit = max(1, maxLimit)
+        self.limit = max(1, maxLimit)
+    }
+    
+    func recordThrottle() {
+        limit = max(1, limit / 2)
+        successStreak = 0
+    }
+    
+    func recordSuccess() {
+        successStreak += 1
+        if successStreak >= limit {
+            limit = min(maxLimit, limit + 1)
+            successStreak = 0
+        }
+    }
+}
+
+/// Caches one directory listing per tile column (z/x), so existence and size checks
+/// cost a single readdir per directory instead of exists + stat per tile.
+actor TileDirectoryIndex {
+    private var listings: [String: [String: Int]] = [:]
+    
+    /// Size in bytes of the file at `url` as of the first lookup in its directory, or nil if absent
+    func fileSize(at url: URL) -> Int? {
+        let dir = url.deletingLastPathComponent()
+        if listings[dir.path] == nil {
+            listings[dir.path] = Self.scan(dir)
+        }
+        return listings[dir.path]?[url.lastPathComponent]
+    }
+    
+    /// Rows of the tile column `dir` whose .bin already exceeds `minSize` bytes and, when
+    /// `requirePNG` is set (PNGs are being kept), that also have a sane (over 256 bytes) .png.
+    /// The listing is kept, so later PNG lookups in a partly converted column reuse it.
+    func convertedRows(inColumn dir: URL, minSize: Int, requirePNG: Bool) -> Set<Int> {
+        let listing = Self.scan(dir)
+        listings[dir.path] = listing
+        var rows = Set<Int>()
+        for (name, size) in listing where size > minSize && name.hasSuffix(".bin") {
+            let stem = name.dropLast(4)
+            if requirePNG, (listing["\(stem).png"] ?? 0) <= 256 {
+                continue
+            }
+            if let y = Int(stem) {
+                rows.insert(y)
+            }
+        }
+        return rows
+    }
+    
+    /// List a directory once, prefetching file sizes with the entries
+    private static func scan(_ dir: URL) -> [String: Int] {
+        guard let urls = try? FileManager.default.contentsOfDirectory(
+            at: dir,
+            includingPropertiesForKeys: [.fileSizeKey],
+            options: [.skipsHiddenFiles]
+        ) else {
+            return [:]
+        }
+        var sizes: [String: Int] = [:]
+        sizes.reserveCapacity(urls.count)
+        for url in urls {
+            if let size = try? url.resourceValues(forKeys: [.fileSizeKey]).fileSize {
+                sizes[url.lastPathComponent] = size
+            }
+        }
+        return sizes
+    }
+}
+
+/// Spaces out request start times so the politeness delay holds across concurrent downloads
+actor RequestPacer {
+    private let interval: Duration
+    private let clock = ContinuousClock()
+    private var nextSlot: ContinuousClock.Instant
+    
+    init(delayMs: Int) {
+        self.interval = .milliseconds(max(0, delayMs))
+        self.nextSlot = ContinuousClock.now
+    }
+    
+    /// Reserve the next request slot and sleep until it arrives
+    func waitForTurn() async {
+        let now = clock.now
+        let slot = max(nextSlot, now)
+        nextSlot = slot + interval
+        if slot > now {
+            try? await Task.sleep(until: slot, clock: clock)
+        }
+    }
+}
+
 /// Errors that can occur during tile download
-enum TileError: LocalizedError {
+nonisolated enum TileError: LocalizedError {
     case invalidURL
     case invalidResponse
     case invalidImageData
@@ -14,4 +14,65 @@ struct MUI_MapsTests {
         // Write your test here and use APIs like `#expect(...)` to check expected conditions.
     }
 
+    @Test func packRGB565TruncatesEachChannel() {
+        // 20 pixels: one full 16-lane SIMD block plus a scalar tail
+        let count = 20
+        var rgba: [UInt8] = []
+        for i in 0..<count {
+            rgba += [UInt8((i * 13) & 0xFF), UInt8((i * 29) & 0xFF), UInt8((i * 7) & 0xFF), 0xFF]
+        }
+        var out = [UInt16](repeating: 0, count: count)
+        rgba.withUnsafeBytes { src in
+            out.withUnsafeMutableBytes { dst in
+                TileConverter.packRGB565(from: src.baseAddress!, to: dst.baseAddress!, pixelCount: count)
+            }
+        }
+        for i in 0..<count {
+            let r = UInt16(rgba[i * 4]), g = UInt16(rgba[i * 4 + 1]), b = UInt16(rgba[i * 4 + 2])
+            #expect(out[i] == ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3))
+        }
+    }
+
+    @Test func urlTemplateSubstitutesPlaceholders() {
+        let osm = TileURLTemplate("https://tile.openstreetmap.org/{z}/{x}/{y}.png")
+        #expect(osm.url(z: 13, x: 2287, y: 3510)?.absoluteString == "https://tile.openstreetmap.org/13/2287/3510.png")
+
+        let carto = TileURLTemplate("https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png")
+        let host = carto.url(z: 1, x: 0, y: 1)?.host() ?? ""
+        #expect(["a", "b", "c", "d"].map { "\($0).basemaps.cartocdn.com" }.contains(host))
+        // Same tile, same URL, so cached responses are found again on the next run
+        #expect(carto.url(z: 1, x: 0, y: 1) == carto.url(z: 1, x: 0, y: 1))
+        #expect(carto.url(z: 13, x: 2287, y: 3510)?.absoluteString == "https://b.basemaps.cartocdn.com/light_all/13/2287/3510.png")
+    }
+
+    @Test func lvglHeaderMatchesV9Layout() throws {
+        let header = try TileConverter.lvglHeader(width: 256, height: 256)
+        // magic, cf=RGB565, flags, w=256, h=256, stride=512, reserved (u16 little-endian)
+        #expect(header == [0x19, 0x12, 0x00, 0x00, 0x00, 0x01, 0x00, 0x01, 0x00, 0x02, 0x00, 0x00])
+    }
+
+    @Test @MainActor func tileRangeEnumeratesColumnsInOrder() {
+        let range = TileRange(z: 3, xs: 2...4, ys: 5...6)
+        #expect(range.count == 6)
+        #expect(range.map(\.id) == ["3/2/5", "3/2/6", "3/3/5", "3/3/6", "3/4/5", "3/4/6"])
+        #expect(Tile.tilesAround(lat: 0, lon: 0, zoom: 4, radius: 2).count == 25)
+        // Poles clamp to the Web Mercator limit instead of projecting to infinity
+        #expect(Tile.deg2num(lat: -90, lon: 0, zoom: 2).y >= 3)
+        #expect(Tile.deg2num(lat: 90, lon: 0, zoom: 2).y == 0)
+    }
+
+    @Test func retryAfterParsesSecondsAndCaps() {
+        func response(_ retryAfter: String) -> HTTPURLResponse {
+            HTTPURLResponse(url: URL(string: "https://tile.openstreetmap.org/0/0/0.png")!,
+                            statusCode: 429, httpVersion: "HTTP/1.1",
+                            headerFields: ["Retry-After": retryAfter])!
+        }
+        #expect(TileDownloader.retryAfter(response("3")) == .seconds(3))
+        #expect(TileDownloader.retryAfter(response("86400")) == .seconds(60))
+        #expect(TileDownloader.retryAfter(response("soon")) == nil)
+        #expect(TileDownloader.retryAfter(response("nan")) == nil)
+        #expect(TileDownloader.retryAfter(response("-5")) == nil)
+        #expect(TileDownloader.backoff(attempt: 10) <= .seconds(10))
+    }
+
 }